@@ -1,9 +1,48 @@
 import os
+import sys
 import json
 import argparse
 import execution
-from urllib import request
+import http.client
 import random
+import select
+import asyncio
+import aiohttp
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_dumps(obj, indent: bool = False) -> bytes:
+    """Serialize obj to UTF-8 encoded JSON bytes, compact unless indent is set."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else None)
+    # Follow orjson's layout (compact, unescaped UTF-8) and refuse NaN/Infinity,
+    # which are not valid JSON; other edge cases such as non-str keys still differ
+    if indent:
+        return json.dumps(obj, indent=2, ensure_ascii=False, allow_nan=False).encode('utf-8')
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False, allow_nan=False).encode('utf-8')
+
+
+def json_loads(data: bytes):
+    """Deserialize JSON from a bytes buffer."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+_PROMPT_TONES = frozenset(('positive', 'negative'))
+
+# Keys accepted in --batch entries and their value types, matching the Workflow.update() arguments
+_BATCH_KEYS = {'prompt': str, 'neg_prompt': str, 'steps': int, 'seed': int}
+
+# Marks cached values that have not been computed yet
+_UNRESOLVED = object()
+
+# Dedicated generator for random seeds (-1), independent of the global random state
+_SEED_RNG = random.Random()
 
 # This is the default path to save your workflows from ComfyUI
 # Workflow should be savec in their API format
@@ -17,28 +56,67 @@ class Workflow:
     It can update prompts, steps, seeds and other workflow parameters.
     """
 
-    def __init__(self, workflow_name):
+    def __init__(self, workflow_name, validate: bool = True):
         """
         Initialize a Workflow object.
         Args:
             workflow_name (str): Name of the workflow JSON file
+            validate (bool): Validate the workflow on load, defaults to True
         Raises:
-            ValueError: If the workflow is not valid
+            ValueError: If the workflow is not in the API format, or not valid when validate is set
         """
+        if not workflow_name.endswith('.json'):
+            workflow_name += '.json'
         self.workflow_name = workflow_name
         self.workflow_data = self.load_workflow()
-        if not self.is_valid():
+        # The caches below assume API format nodes, so reject anything else first
+        if not self._quick_structural_check():
+            raise ValueError(f"Workflow {self.workflow_name} is not valid")
+        self._input_index = self._build_input_index()
+        self._model_ckpt = _UNRESOLVED
+        self._prompt_node_ids = {}
+        self._node_bytes = {}
+        self._version = 0
+        self._validation = None
+        self._connection = None
+        self._connection_address = None
+        if validate and not self.is_valid():
             raise ValueError(f"Workflow {self.workflow_name} is not valid")
         
     def is_valid(self):
         """
-        Check if the workflow is valid.
+        Check the workflow structure and run execution.validate_prompt on it.
+        The full validator's verdict is not enforced: its result tuple is returned
+        as is and is always truthy, so only the structural check can fail here.
+        Without the extra and custom nodes loaded, and with combo inputs checked
+        against local model folders, enforcing it would reject workflows the
+        server accepts. The result is cached until the workflow is modified.
         Returns:
-            bool: True if workflow is valid, False otherwise
+            False if the structural check fails, otherwise the
+            (valid, error, outputs, node_errors) tuple from validate_prompt
         """
-        valid = execution.validate_prompt(self.workflow_data)
+        key = (id(self.workflow_data), self._version)
+        if self._validation is not None and self._validation[0] == key:
+            return self._validation[1]
+        valid = self._quick_structural_check() and execution.validate_prompt(self.workflow_data)
+        self._validation = (key, valid)
         return valid
 
+    def _quick_structural_check(self):
+        """
+        Cheaply reject workflows that are not in the API format before running the full validation.
+        Returns:
+            bool: True if every node is a dict with a 'class_type' string and an 'inputs' dict
+        """
+        if not isinstance(self.workflow_data, dict):
+            return False
+        for node in self.workflow_data.values():
+            if not isinstance(node, dict):
+                return False
+            if not isinstance(node.get('class_type'), str) or not isinstance(node.get('inputs'), dict):
+                return False
+        return True
+
     def load_workflow(self):
         """
         Load workflow data from JSON file.
@@ -47,13 +125,59 @@ class Workflow:
         Raises:
             FileNotFoundError: If workflow file is not found
         """
-        if not self.workflow_name.endswith('.json'):
-            self.workflow_name += '.json'
         workflow_path = os.path.join(DEFAULT_WORKFLOW_PATH, self.workflow_name)
-        if not os.path.exists(workflow_path):
-            raise FileNotFoundError(f"Workflow file not found: {workflow_path}")
-        with open(workflow_path, 'r') as f:
-            return json.load(f)
+        # Read the whole file with one syscall, bypassing the buffered IO stack
+        try:
+            fd = os.open(workflow_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Workflow file not found: {workflow_path}") from None
+        try:
+            data = os.read(fd, os.fstat(fd).st_size)
+        finally:
+            os.close(fd)
+        return json_loads(data)
+
+    def _build_input_index(self):
+        """
+        Map each input name to the nodes that declare it.
+        Returns:
+            dict: Input name -> list of (node ID, inputs dict), in workflow order
+        """
+        index = {}
+        for node_id, node in self.workflow_data.items():
+            inputs = node.get('inputs', {})
+            for input_name in inputs:
+                index.setdefault(input_name, []).append((node_id, inputs))
+        return index
+
+    def _find_model_ckpt(self):
+        """
+        Resolve the checkpoint name of the model used by the workflow.
+        Returns:
+            str: Checkpoint name if found, None otherwise
+        """
+        for _, inputs in self._input_index.get('model', ()):
+            link = inputs['model']
+            # Only [node_id, slot] links point at a loader; skip scalar widget values
+            if not isinstance(link, list) or len(link) != 2:
+                continue
+            model_node = self.workflow_data.get(link[0])
+            if not isinstance(model_node, dict) or not isinstance(model_node.get('inputs'), dict):
+                return None
+            return model_node['inputs'].get('ckpt_name')
+        return None
+
+    def _clear_cache(self):
+        """
+        Rebuild the input index and forget cached node IDs and encodings.
+        Call this after replacing or editing workflow_data directly; only the
+        update_* methods keep the caches in sync on their own.
+        """
+        self._input_index = self._build_input_index()
+        self._model_ckpt = _UNRESOLVED
+        self._prompt_node_ids = {}
+        self._node_bytes = {}
+        self._version += 1
 
     def get_prompt_node_id(self, tone: str) -> str:
         """
@@ -65,13 +189,27 @@ class Workflow:
         Raises:
             ValueError: If tone is not 'positive' or 'negative'
         """
-        if tone not in ['positive', 'negative']:
+        if tone not in _PROMPT_TONES:
             raise ValueError("tone should be 'positive' or 'negative'.")
-        for node in self.workflow_data:
-            if tone in self.workflow_data[node]['inputs']:
-                node_id = self.workflow_data[node]['inputs'][tone][0]
-                return node_id
-        return None
+        return self._prompt_node_id(tone)
+
+    def _prompt_node_id(self, tone: str) -> str:
+        """
+        Get the node ID for a prompt of specified tone, without checking the tone.
+        Args:
+            tone (str): Either 'positive' or 'negative'
+        Returns:
+            str: Node ID if found, None otherwise
+        """
+        node_id = self._prompt_node_ids.get(tone, _UNRESOLVED)
+        if node_id is not _UNRESOLVED:
+            return node_id
+        node_id = None
+        entries = self._input_index.get(tone)
+        if entries:
+            node_id = entries[0][1][tone][0]
+        self._prompt_node_ids[tone] = node_id
+        return node_id
 
     def update_positive_prompt(self, prompt): 
         """
@@ -79,9 +217,11 @@ class Workflow:
         Args:
             prompt (str): New positive prompt text
         """
-        positive_node_id = self.get_prompt_node_id('positive')
+        positive_node_id = self._prompt_node_id('positive')
         if positive_node_id is not None:
             self.workflow_data[positive_node_id]['inputs']['text'] = prompt
+            self._node_bytes.pop(positive_node_id, None)
+            self._version += 1
         else:
             print("No positive node found")
 
@@ -91,16 +231,18 @@ class Workflow:
         Args:
             prompt (str): New negative prompt text
         """
-        negative_node_id = self.get_prompt_node_id('negative')
+        negative_node_id = self._prompt_node_id('negative')
         if negative_node_id is not None:
             self.workflow_data[negative_node_id]['inputs']['text'] = prompt
+            self._node_bytes.pop(negative_node_id, None)
+            self._version += 1
         else:
             print("No negative node found")
         
     def show_prompts(self):
         """Display both positive and negative prompts from the workflow."""
-        positive_node_id = self.get_prompt_node_id('positive')
-        negative_node_id = self.get_prompt_node_id('negative')
+        positive_node_id = self._prompt_node_id('positive')
+        negative_node_id = self._prompt_node_id('negative')
         if positive_node_id is not None:
             print(f"Positive prompt: {self.workflow_data[positive_node_id]['inputs']['text']}")
         if negative_node_id is not None:
@@ -117,33 +259,181 @@ class Workflow:
         Raises:
             ValueError: If no node of specified type is found
         """
-        for node in self.workflow_data:
-            if node_type in self.workflow_data[node]['inputs']:
-                node_id = self.workflow_data[node]['inputs'][node_type][0]
-                return node_id
+        entries = self._input_index.get(node_type)
+        if entries:
+            return entries[0][1][node_type][0]
         raise ValueError("No node found")
             
     def print_model(self):
         """Display the model checkpoint name used in the workflow."""
-        model_node_id = self.get_node_id('model')
-        if model_node_id is not None:
-            print(f"Model: {self.workflow_data[model_node_id]['inputs']['ckpt_name']}")
+        if self._model_ckpt is _UNRESOLVED:
+            self._model_ckpt = self._find_model_ckpt()
+        if self._model_ckpt is not None:
+            print(f"Model: {self._model_ckpt}")
+        else:
+            print("No model found")
 
     def queue_prompt(self, server_adress):
         """
         Queue the workflow for execution on ComfyUI server.
         Args:
             server_adress (str): Address of ComfyUI server
+        Returns:
+            dict: Server response
+        Raises:
+            RuntimeError: If the server rejects the prompt
+        """
+        data = self.encode_prompt()
+        headers = {'Content-Type': 'application/json'}
+        connection = self._get_connection(server_adress)
+        if connection.sock is not None and select.select([connection.sock], [], [], 0)[0]:
+            # An idle keep-alive socket only becomes readable once the server closed it
+            connection.close()
+        reused = connection.sock is not None
+        try:
+            try:
+                connection.request('POST', '/prompt', body=data, headers=headers)
+                response = connection.getresponse()
+            except http.client.RemoteDisconnected:
+                # Only retry when the server closed an idle keep-alive socket without
+                # answering; anything else may mean the prompt was already queued
+                if not reused:
+                    raise
+                connection.close()
+                connection.request('POST', '/prompt', body=data, headers=headers)
+                response = connection.getresponse()
+            # Drain the body so the connection can be reused for the next prompt
+            body = response.read()
+        except BaseException:
+            # A failed exchange leaves the connection mid-request, reset it so the next call reconnects
+            connection.close()
+            raise
+        if response.status != 200:
+            raise RuntimeError(f"Failed to queue prompt ({response.status}): {body.decode('utf-8', 'replace')}")
+        return json_loads(body)
+
+    async def queue_prompt_async(self, session, server_adress, data: bytes = None):
+        """
+        Queue the workflow for execution on ComfyUI server without blocking.
+        Args:
+            session (aiohttp.ClientSession): Session used to submit the prompt
+            server_adress (str): Address of ComfyUI server
+            data (bytes, optional): Body from encode_prompt(), required if the workflow
+                is modified before this coroutine runs
+        Returns:
+            dict: Server response
+        Raises:
+            RuntimeError: If the server rejects the prompt
+        """
+        if data is None:
+            data = self.encode_prompt()
+        headers = {'Content-Type': 'application/json'}
+        async with session.post(f"http://{server_adress}/prompt", data=data, headers=headers) as response:
+            body = await response.read()
+        if response.status != 200:
+            raise RuntimeError(f"Failed to queue prompt ({response.status}): {body.decode('utf-8', 'replace')}")
+        return json_loads(body)
+
+    def encode_prompt(self) -> bytes:
+        """
+        Encode the workflow as a /prompt request body.
+        Each node is serialized once and cached; the update_* methods drop the
+        cache entry of the nodes they touch, so only those are re-encoded.
+        Direct edits to workflow_data are not tracked: call _clear_cache() after
+        making them, or stale node encodings are sent.
+        Returns:
+            bytes: JSON body of the form {"prompt": workflow_data}
+        """
+        node_bytes = self._node_bytes
+        fragments = []
+        for node_id, node in self.workflow_data.items():
+            fragment = node_bytes.get(node_id)
+            if fragment is None:
+                fragment = json_dumps(node_id) + b':' + json_dumps(node)
+                node_bytes[node_id] = fragment
+            fragments.append(fragment)
+        return b'{"prompt":{' + b','.join(fragments) + b'}}'
+
+    def _get_connection(self, server_adress):
+        """
+        Get a keep-alive connection to the ComfyUI server, opening it on first use.
+        Args:
+            server_adress (str): Address of ComfyUI server
+        Returns:
+            http.client.HTTPConnection: Connection to the server
         """
-        prompt = {"prompt": self.workflow_data}
-        data = json.dumps(prompt).encode('utf-8')
-        req =  request.Request(f"http://{server_adress}/prompt", data=data)
-        # print(json.loads(request.urlopen(req).read()))
+        if self._connection is None or self._connection_address != server_adress:
+            self.close()
+            self._connection = http.client.HTTPConnection(server_adress)
+            self._connection_address = server_adress
+        return self._connection
+
+    def close(self):
+        """Close the connection to the ComfyUI server, if one is open."""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+            self._connection_address = None
 
     def describe(self):
         """Print the complete workflow data structure."""
-        import pprint
-        pprint.pprint(self.workflow_data)
+        data = json_dumps(self.workflow_data, indent=True)
+        buffer = getattr(sys.stdout, 'buffer', None)
+        if buffer is None:
+            # Text-only streams such as io.StringIO, Jupyter or IDLE
+            sys.stdout.write(data.decode('utf-8') + '\n')
+            return
+        sys.stdout.flush()
+        buffer.write(data + b'\n')
+        buffer.flush()
+
+    def update(self, prompt: str = None, neg_prompt: str = None, steps: int = None, seed: int = None):
+        """
+        Apply parameter overrides to the workflow, skipping those left as None.
+        Args:
+            prompt (str, optional): New positive prompt text
+            neg_prompt (str, optional): New negative prompt text
+            steps (int, optional): New number of steps
+            seed (int, optional): New seed value (-1 for random)
+        """
+        if prompt is not None:
+            self.update_positive_prompt(prompt)
+        if neg_prompt is not None:
+            self.update_negative_prompt(neg_prompt)
+        if steps is not None or seed is not None:
+            self.update_sampler_params(steps=steps, seed=seed)
+
+    def _snapshot_params(self):
+        """
+        Record the current values of the inputs that update() can change.
+        Returns:
+            list: (node ID, input name, value) for each prompt text, steps and seed input
+        """
+        snapshot = []
+        for tone in ('positive', 'negative'):
+            node_id = self._prompt_node_id(tone)
+            if node_id is not None and 'text' in self.workflow_data[node_id]['inputs']:
+                snapshot.append((node_id, 'text', self.workflow_data[node_id]['inputs']['text']))
+        for key in ('steps', 'seed'):
+            for node_id, inputs in self._input_index.get(key, ()):
+                snapshot.append((node_id, key, inputs[key]))
+        return snapshot
+
+    def _restore_params(self, snapshot):
+        """
+        Reset the inputs recorded by _snapshot_params(), re-encoding only nodes that changed.
+        Args:
+            snapshot (list): Result of _snapshot_params()
+        """
+        changed = False
+        for node_id, key, value in snapshot:
+            inputs = self.workflow_data[node_id]['inputs']
+            if inputs[key] != value:
+                inputs[key] = value
+                self._node_bytes.pop(node_id, None)
+                changed = True
+        if changed:
+            self._version += 1
 
     def update_steps(self, steps: int = None):
         """
@@ -151,10 +441,7 @@ class Workflow:
         Args:
             steps (int): New number of steps
         """
-        for node in self.workflow_data:
-            if "steps" in self.workflow_data[node]['inputs']:
-                self.workflow_data[node]['inputs']['steps'] = steps
-                
+        self.update_sampler_params(steps=steps)
 
     def update_seed(self, seed: int) -> str:
         """
@@ -162,12 +449,30 @@ class Workflow:
         Args:
             seed (int): New seed value (-1 for random)
         """
-        for node in self.workflow_data:
-            if "seed" in self.workflow_data[node]['inputs']:
-                if seed == -1:
-                    self.workflow_data[node]['inputs']['seed'] = random.randint(0, 1000000)
-                else:
-                    self.workflow_data[node]['inputs']['seed'] = seed
+        self.update_sampler_params(seed=seed)
+
+    def update_sampler_params(self, steps: int = None, seed: int = None):
+        """
+        Update sampling steps and seed in a single pass over the sampler nodes.
+        Args:
+            steps (int, optional): New number of steps, left unchanged if None
+            seed (int, optional): New seed value (-1 for random), left unchanged if None
+        """
+        nodes = {}
+        if steps is not None:
+            nodes.update(self._input_index.get('steps', ()))
+        if seed is not None:
+            nodes.update(self._input_index.get('seed', ()))
+        if nodes:
+            self._version += 1
+        random_seed = seed == -1
+        randrange = _SEED_RNG.randrange
+        for node_id, inputs in nodes.items():
+            self._node_bytes.pop(node_id, None)
+            if steps is not None and 'steps' in inputs:
+                inputs['steps'] = steps
+            if seed is not None and 'seed' in inputs:
+                inputs['seed'] = randrange(1000001) if random_seed else seed
 
     def save_workflow(self, workflow_name: str = None):
         """
@@ -177,15 +482,87 @@ class Workflow:
         """
         if workflow_name is None:
             workflow_name = self.workflow_name
-        if not workflow_name.endswith('.json'):
+        elif not workflow_name.endswith('.json'):
             workflow_name += '.json'
-        with open(os.path.join(DEFAULT_WORKFLOW_PATH, workflow_name), 'w') as f:
-            json.dump(self.workflow_data, f)
+        workflow_path = os.path.join(DEFAULT_WORKFLOW_PATH, workflow_name)
+        # Encode up front and write once; json.dump issues a write per token.
+        with open(workflow_path, 'wb') as f:
+            f.write(json_dumps(self.workflow_data))
+
+def _check_batch_value(value, expected_type):
+    """Check a batch value against its type; None means keep the base value, bools are not ints."""
+    return value is None or (isinstance(value, expected_type) and not isinstance(value, bool))
+
+
+def _check_batch_entries(entries):
+    """
+    Check the shape of --batch entries before anything is modified or submitted.
+    Args:
+        entries: Parsed batch file
+    Raises:
+        ValueError: If entries is not a list, or an entry is malformed
+    """
+    if not isinstance(entries, list):
+        raise ValueError(f"Batch must be a list of entries, got {type(entries).__name__}")
+    for i, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            if not _check_batch_value(entry, int):
+                raise ValueError(f"Batch entry {i} must be an object or a seed, got {entry!r}")
+            continue
+        unknown = entry.keys() - _BATCH_KEYS.keys()
+        if unknown:
+            raise ValueError(f"Batch entry {i} has unknown keys {sorted(unknown)}, expected any of {sorted(_BATCH_KEYS)}")
+        for key, value in entry.items():
+            if not _check_batch_value(value, _BATCH_KEYS[key]):
+                raise ValueError(f"Batch entry {i} has {key}={value!r}, expected {_BATCH_KEYS[key].__name__}")
+
+
+async def queue_batch(workflow, server_address, entries, limit: int = 16):
+    """
+    Queue one prompt per batch entry, keeping up to `limit` submissions in flight.
+    The workflow is loaded and validated once by the caller; each entry only
+    re-encodes the nodes it modifies. Every entry starts from the workflow's
+    values at call time, so keys an entry omits keep their base values, and
+    the workflow is restored to them afterwards.
+    Args:
+        workflow (Workflow): Workflow to submit
+        server_address (str): Address of ComfyUI server
+        entries (list): Overrides per prompt, either a dict with any of the keys
+            'prompt', 'neg_prompt', 'steps' and 'seed', or a bare seed value
+        limit (int): Maximum number of concurrent connections
+    Returns:
+        list: Server response per entry, in entry order; entries whose submission
+            failed hold the exception instead, the others are still queued
+    Raises:
+        ValueError: If entries is not a list, or an entry is malformed
+    """
+    _check_batch_entries(entries)
+    base = workflow._snapshot_params()
+    connector = aiohttp.TCPConnector(limit=limit, keepalive_timeout=60)
+    try:
+        async with aiohttp.ClientSession(connector=connector) as session:
+            submissions = []
+            for entry in entries:
+                workflow._restore_params(base)
+                if isinstance(entry, dict):
+                    workflow.update(**entry)
+                else:
+                    workflow.update(seed=entry)
+                # Encode now, the next entry modifies the workflow before this is sent
+                data = workflow.encode_prompt()
+                submissions.append(workflow.queue_prompt_async(session, server_address, data))
+            # Let every submission finish so one failure does not hide which prompts were queued
+            return await asyncio.gather(*submissions, return_exceptions=True)
+    finally:
+        workflow._restore_params(base)
 
-def parse_args():
+
+def parse_args(argv=None):
     """
     Parse command line arguments.
-    
+
+    Args:
+        argv (list, optional): Arguments to parse, defaults to sys.argv
     Returns:
         argparse.Namespace: Parsed command line arguments
     """
@@ -198,20 +575,40 @@ def parse_args():
     parser.add_argument('--port', type=int, default=8188, help='ComfyUI server port')
     parser.add_argument('--host', type=str, default='127.0.0.1', help='ComfyUI server host')
     parser.add_argument('--save', type=str, help='Save the workflow to a file')
-    return parser.parse_args()
+    parser.add_argument('--batch', type=str, help='JSON file with a list of overrides ({"prompt", "neg_prompt", "steps", "seed"} or a seed), one prompt is queued per entry')
+    return parser.parse_args(argv)
 
-if __name__ == "__main__":
-    args = parse_args()
+
+def main(argv=None):
+    """
+    Run the command line interface.
+    Args:
+        argv (list, optional): Command line arguments, defaults to sys.argv
+    """
+    args = parse_args(argv)
     server_address = f"{args.host}:{args.port}"
-    workflow = Workflow(args.workflow)    
-    if args.prompt:
-        workflow.update_positive_prompt(args.prompt)
-    if args.neg_prompt:
-        workflow.update_negative_prompt(args.neg_prompt)
-    if args.steps:
-        workflow.update_steps(args.steps)
-    if args.seed:
-        workflow.update_seed(args.seed)
+    # Validate once, after all overrides are applied; see is_valid for what is enforced
+    workflow = Workflow(args.workflow, validate=False)
+    workflow.update(prompt=args.prompt, neg_prompt=args.neg_prompt, steps=args.steps, seed=args.seed)
+    if not workflow.is_valid():
+        raise ValueError(f"Workflow {workflow.workflow_name} is not valid")
     if args.save:
         workflow.save_workflow(args.save)
-    workflow.queue_prompt(server_address)
+    if args.batch is not None:
+        with open(args.batch, 'rb') as f:
+            entries = json_loads(f.read())
+        results = asyncio.run(queue_batch(workflow, server_address, entries))
+        failed = [i for i, result in enumerate(results) if isinstance(result, BaseException)]
+        for i in failed:
+            print(f"Batch entry {i} failed: {results[i]}", file=sys.stderr)
+        if failed:
+            raise SystemExit(f"{len(failed)} of {len(results)} batch entries failed, the others were queued")
+    else:
+        try:
+            workflow.queue_prompt(server_address)
+        finally:
+            workflow.close()
+
+
+if __name__ == "__main__":
+    main()
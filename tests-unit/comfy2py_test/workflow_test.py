@@ -0,0 +1,381 @@
+import http.server
+import io
+import json
+import select
+import socket
+import threading
+import aiohttp
+import pytest
+from aiohttp import web
+
+import comfy2py
+
+
+WORKFLOW = {
+    "3": {
+        "class_type": "KSampler",
+        "inputs": {
+            "seed": 5,
+            "steps": 20,
+            "model": ["4", 0],
+            "positive": ["6", 0],
+            "negative": ["7", 0],
+        },
+    },
+    "4": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "sd.safetensors"}},
+    "6": {"class_type": "CLIPTextEncode", "inputs": {"text": "a cat", "clip": ["4", 1]}},
+    "7": {"class_type": "CLIPTextEncode", "inputs": {"text": "blurry", "clip": ["4", 1]}},
+    "9": {"class_type": "SaveImage", "inputs": {"images": ["3", 0]}},
+}
+
+
+@pytest.fixture
+def validate_calls(monkeypatch):
+    """Replace the node registry based validation with a stub that records its calls"""
+    calls = []
+
+    def validate_prompt(prompt):
+        calls.append(prompt)
+        return (True, None, [], [])
+
+    monkeypatch.setattr(comfy2py.execution, "validate_prompt", validate_prompt)
+    return calls
+
+
+@pytest.fixture
+def workflow_dir(tmp_path, monkeypatch, validate_calls):
+    monkeypatch.setattr(comfy2py, "DEFAULT_WORKFLOW_PATH", str(tmp_path))
+    (tmp_path / "test.json").write_text(json.dumps(WORKFLOW))
+    return tmp_path
+
+
+@pytest.fixture
+def workflow(workflow_dir):
+    return comfy2py.Workflow("test")
+
+
+def decoded_prompt(workflow):
+    return json.loads(workflow.encode_prompt())
+
+
+def test_encode_prompt_matches_workflow_data(workflow):
+    assert decoded_prompt(workflow) == {"prompt": workflow.workflow_data}
+
+
+@pytest.mark.parametrize("update, node_id, key, value", [
+    (lambda w: w.update_positive_prompt("a dog"), "6", "text", "a dog"),
+    (lambda w: w.update_negative_prompt("low quality"), "7", "text", "low quality"),
+    (lambda w: w.update_steps(8), "3", "steps", 8),
+    (lambda w: w.update_seed(42), "3", "seed", 42),
+    (lambda w: w.update_sampler_params(steps=3, seed=7), "3", "seed", 7),
+    (lambda w: w.update(prompt="a bird", steps=4), "6", "text", "a bird"),
+])
+def test_encode_prompt_after_update(workflow, update, node_id, key, value):
+    workflow.encode_prompt()  # populate the per-node cache
+    update(workflow)
+    prompt = decoded_prompt(workflow)
+    assert prompt == {"prompt": workflow.workflow_data}
+    assert prompt["prompt"][node_id]["inputs"][key] == value
+
+
+def test_encode_prompt_random_seed(workflow):
+    workflow.encode_prompt()
+    workflow.update_seed(-1)
+    seed = decoded_prompt(workflow)["prompt"]["3"]["inputs"]["seed"]
+    assert seed == workflow.workflow_data["3"]["inputs"]["seed"]
+    assert 0 <= seed <= 1000000
+
+
+def test_encode_prompt_after_direct_edit_needs_clear_cache(workflow):
+    workflow.encode_prompt()
+    workflow.workflow_data["4"]["inputs"]["ckpt_name"] = "other.safetensors"
+    workflow._clear_cache()
+    assert decoded_prompt(workflow) == {"prompt": workflow.workflow_data}
+
+
+def test_is_valid_is_cached_until_modified(workflow, validate_calls):
+    assert len(validate_calls) == 1  # validated on load
+    assert workflow.is_valid()
+    assert len(validate_calls) == 1
+
+    workflow.update_steps(10)
+    assert workflow.is_valid()
+    assert len(validate_calls) == 2
+
+    workflow._clear_cache()
+    assert workflow.is_valid()
+    assert len(validate_calls) == 3
+
+
+def test_validate_false_skips_validation(workflow_dir, validate_calls):
+    comfy2py.Workflow("test", validate=False)
+    assert validate_calls == []
+
+
+@pytest.fixture
+def queued(monkeypatch):
+    """Capture the prompts the CLI would send instead of contacting a server"""
+    prompts = []
+
+    def queue_prompt(self, server_adress):
+        prompts.append(json.loads(self.encode_prompt())["prompt"])
+        return {}
+
+    monkeypatch.setattr(comfy2py.Workflow, "queue_prompt", queue_prompt)
+    return prompts
+
+
+@pytest.mark.parametrize("flag, node_id, key", [
+    ("--seed", "3", "seed"),
+    ("--steps", "3", "steps"),
+])
+def test_cli_applies_zero_overrides(workflow_dir, queued, flag, node_id, key):
+    comfy2py.main(["--workflow", "test", flag, "0"])
+    assert queued[0][node_id]["inputs"][key] == 0
+
+
+def test_cli_applies_empty_prompt(workflow_dir, queued):
+    comfy2py.main(["--workflow", "test", "--prompt", ""])
+    assert queued[0]["6"]["inputs"]["text"] == ""
+
+
+class PromptHandler(http.server.BaseHTTPRequestHandler):
+    """Minimal keep-alive /prompt endpoint recording the client port of each request"""
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.requests.append((self.client_address[1], self.headers["Content-Type"], json.loads(body)))
+        out = json.dumps(self.server.reply).encode("utf-8")
+        self.send_response(self.server.status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+        # Drop the socket without announcing it, like an expired keep-alive timeout
+        self.close_connection = self.server.close_after_response
+
+    def log_message(self, format, *args):
+        pass
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def prompt_server():
+    """Start local HTTP/1.1 servers on demand, returning the server object"""
+    servers = []
+
+    def start(port=0, status=200, close_after_response=False):
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", port), PromptHandler)
+        server.daemon_threads = True
+        server.requests = []
+        server.reply = {"prompt_id": "abc", "number": 0, "node_errors": {}}
+        server.status = status
+        server.close_after_response = close_after_response
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def server_address(server):
+    return f"127.0.0.1:{server.server_address[1]}"
+
+
+def test_queue_prompt_reuses_connection(workflow, prompt_server):
+    server = prompt_server()
+    try:
+        assert workflow.queue_prompt(server_address(server)) == server.reply
+        workflow.update_seed(7)
+        assert workflow.queue_prompt(server_address(server)) == server.reply
+    finally:
+        workflow.close()
+    (port1, content_type, prompt1), (port2, _, prompt2) = server.requests
+    assert port1 == port2
+    assert content_type == "application/json"
+    assert prompt1 == {"prompt": WORKFLOW}
+    assert prompt2["prompt"]["3"]["inputs"]["seed"] == 7
+
+
+def test_queue_prompt_reopens_idle_socket_closed_by_server(workflow, prompt_server):
+    server = prompt_server(close_after_response=True)
+    try:
+        workflow.queue_prompt(server_address(server))
+        # Wait until the server has closed the kept-alive socket
+        assert select.select([workflow._connection.sock], [], [], 5)[0]
+        workflow.queue_prompt(server_address(server))
+    finally:
+        workflow.close()
+    assert len(server.requests) == 2
+    assert server.requests[0][0] != server.requests[1][0]
+
+
+def test_queue_prompt_raises_on_error_status(workflow, prompt_server):
+    server = prompt_server(status=400)
+    try:
+        with pytest.raises(RuntimeError, match="400"):
+            workflow.queue_prompt(server_address(server))
+    finally:
+        workflow.close()
+
+
+def test_queue_prompt_recovers_after_failed_connection(workflow, prompt_server):
+    port = free_port()
+    try:
+        with pytest.raises(ConnectionRefusedError):
+            workflow.queue_prompt(f"127.0.0.1:{port}")
+        server = prompt_server(port=port)
+        assert workflow.queue_prompt(f"127.0.0.1:{port}") == server.reply
+    finally:
+        workflow.close()
+    assert len(server.requests) == 1
+
+
+def test_print_model(workflow, capsys):
+    workflow.print_model()
+    assert capsys.readouterr().out == "Model: sd.safetensors\n"
+
+
+@pytest.mark.parametrize("model_input", [5, "4"])
+def test_scalar_model_widget_does_not_break_loading(workflow_dir, capsys, model_input):
+    data = json.loads(json.dumps(WORKFLOW))
+    data["3"]["inputs"]["model"] = model_input
+    (workflow_dir / "widget.json").write_text(json.dumps(data))
+    workflow = comfy2py.Workflow("widget")
+    workflow.print_model()
+    assert capsys.readouterr().out == "No model found\n"
+
+
+def test_describe_without_binary_stdout(workflow, monkeypatch):
+    stdout = io.StringIO()
+    monkeypatch.setattr(comfy2py.sys, "stdout", stdout)
+    workflow.describe()
+    assert json.loads(stdout.getvalue()) == workflow.workflow_data
+
+
+@pytest.mark.parametrize("data", [
+    [],
+    {"1": "not a node"},
+    {"1": {"class_type": "KSampler"}},
+    {"1": {"class_type": 3, "inputs": {}}},
+    {"1": {"class_type": "KSampler", "inputs": {"model": ["2", 0]}}, "2": {"class_type": "CheckpointLoaderSimple"}},
+])
+@pytest.mark.parametrize("validate", [True, False])
+def test_malformed_workflow_raises_value_error(workflow_dir, validate_calls, data, validate):
+    (workflow_dir / "malformed.json").write_text(json.dumps(data))
+    with pytest.raises(ValueError):
+        comfy2py.Workflow("malformed", validate=validate)
+    assert validate_calls == []
+
+
+@pytest.fixture
+def queued_async(monkeypatch):
+    """Capture the bodies queue_batch would send instead of contacting a server"""
+    prompts = []
+
+    async def queue_prompt_async(self, session, server_adress, data=None):
+        prompts.append(json.loads(data)["prompt"])
+        return {}
+
+    monkeypatch.setattr(comfy2py.Workflow, "queue_prompt_async", queue_prompt_async)
+    return prompts
+
+
+def sampler_params(prompt):
+    return prompt["6"]["inputs"]["text"], prompt["3"]["inputs"]["seed"], prompt["3"]["inputs"]["steps"]
+
+
+@pytest.mark.asyncio
+async def test_batch_entries_do_not_leak_overrides(workflow, queued_async):
+    workflow.update(prompt="base", steps=20)
+    entries = [{"prompt": "cat", "steps": 5, "seed": 1}, {"seed": 2}, 3]
+    await comfy2py.queue_batch(workflow, "127.0.0.1:8188", entries)
+    assert [sampler_params(p) for p in queued_async] == [
+        ("cat", 1, 5),
+        ("base", 2, 20),
+        ("base", 3, 20),
+    ]
+    # The workflow is left at its base values
+    assert sampler_params(workflow.workflow_data) == ("base", 5, 20)
+    assert decoded_prompt(workflow) == {"prompt": workflow.workflow_data}
+
+
+@pytest.mark.asyncio
+async def test_batch_rejects_unknown_keys(workflow, queued_async):
+    with pytest.raises(ValueError, match="unknown keys"):
+        await comfy2py.queue_batch(workflow, "127.0.0.1:8188", [{"seed": 1}, {"cfg": 7}])
+    assert queued_async == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("entries", [
+    {"seed": 4},
+    "seeds.json",
+    [1, "2"],
+    [True],
+    [[1, 2]],
+    [{"steps": "20"}],
+    [{"seed": 1.5}],
+    [{"prompt": 3}],
+])
+async def test_batch_rejects_malformed_entries(workflow, queued_async, entries):
+    with pytest.raises(ValueError, match="Batch"):
+        await comfy2py.queue_batch(workflow, "127.0.0.1:8188", entries)
+    assert queued_async == []
+    assert decoded_prompt(workflow) == {"prompt": WORKFLOW}
+
+
+@pytest.fixture
+def aiohttp_prompt_app():
+    """aiohttp app serving /prompt that rejects seed 13 with a 400"""
+    app = web.Application()
+    app["requests"] = []
+
+    async def prompt(request):
+        body = await request.read()
+        app["requests"].append((request.content_type, json.loads(body)["prompt"]))
+        if json.loads(body)["prompt"]["3"]["inputs"]["seed"] == 13:
+            return web.json_response({"error": "bad seed"}, status=400)
+        return web.json_response({"prompt_id": f"id-{len(app['requests'])}"})
+
+    app.router.add_post("/prompt", prompt)
+    return app
+
+
+@pytest.mark.asyncio
+async def test_queue_prompt_async_posts_to_server(workflow, aiohttp_server, aiohttp_prompt_app):
+    server = await aiohttp_server(aiohttp_prompt_app)
+    async with aiohttp.ClientSession() as session:
+        response = await workflow.queue_prompt_async(session, f"{server.host}:{server.port}")
+        assert response == {"prompt_id": "id-1"}
+        workflow.update_seed(13)
+        with pytest.raises(RuntimeError, match="400"):
+            await workflow.queue_prompt_async(session, f"{server.host}:{server.port}")
+    assert aiohttp_prompt_app["requests"][0] == ("application/json", WORKFLOW)
+
+
+@pytest.mark.asyncio
+async def test_batch_reports_failures_per_entry(workflow, aiohttp_server, aiohttp_prompt_app):
+    server = await aiohttp_server(aiohttp_prompt_app)
+    results = await comfy2py.queue_batch(workflow, f"{server.host}:{server.port}", [1, 13, 2])
+    assert isinstance(results[1], RuntimeError)
+    assert results[0]["prompt_id"].startswith("id-")
+    assert results[2]["prompt_id"].startswith("id-")
+    seeds = sorted(prompt["3"]["inputs"]["seed"] for _, prompt in aiohttp_prompt_app["requests"])
+    assert seeds == [1, 2, 13]
+
+
+def test_json_dumps_fallback_rejects_nan(monkeypatch):
+    monkeypatch.setattr(comfy2py, "orjson", None)
+    assert comfy2py.json_dumps({"a": [1, "é"]}) == '{"a":[1,"é"]}'.encode('utf-8')
+    with pytest.raises(ValueError):
+        comfy2py.json_dumps({"cfg": float("nan")})